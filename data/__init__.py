@@ -22,3 +22,6 @@ FEATURES_TRAIN = os.path.join(data_dir, "features_train.npz")
 # manually captured data
 CAPTURED_DATA = os.path.join(data_dir, "capture.csv")
 DEMO_DATA = os.path.join(data_dir, "demo.csv")
+
+# time-indexed capture store
+CAPTURE_STORE = os.path.join(data_dir, "capture_store")
@@ -2,6 +2,8 @@
 
 import logging
 
+import scripts.capture_store
+import scripts.cross_validation
 import scripts.demo
 import scripts.feature_extraction
 import scripts.ml_model
@@ -18,8 +20,10 @@ def main(
     preprocess: bool,
     features: bool,
     train: bool,
+    validate: bool,
     rule: bool,
     demo: bool,
+    store: bool,
     cleanup: bool,
 ):
     """Run the specified scripts.
@@ -34,8 +38,10 @@ def main(
         scripts.preprocessing.run() if preprocess else None
         scripts.feature_extraction.run() if features else None
         scripts.ml_model.run() if train else None
+        scripts.cross_validation.run() if validate else None
         scripts.rule_based.run() if rule else None
         scripts.demo.run() if demo else None
+        scripts.capture_store.run(build=True) if store else None
     except KeyboardInterrupt:
         print()
         LOGGER.warning("Execution interrupted")
@@ -63,12 +69,18 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t", "--train", action="store_true", help="train models"
     )
+    parser.add_argument(
+        "-k", "--validate", action="store_true", help="cross-validate model"
+    )
     parser.add_argument(
         "-r", "--rule", action="store_true", help="run rule-based model"
     )
     parser.add_argument(
         "-d", "--demo", action="store_true", help="run demo (requires admin)"
     )
+    parser.add_argument(
+        "-s", "--store", action="store_true", help="build capture store"
+    )
     parser.add_argument(
         "-c", "--cleanup", action="store_true", help="clean up previous logs"
     )
@@ -79,7 +91,9 @@ if __name__ == "__main__":
         args.preprocess,
         args.features,
         args.train,
+        args.validate,
         args.rule,
         args.demo,
+        args.store,
         args.cleanup,
     )
@@ -0,0 +1,468 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Callable, Iterator
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+import data
+import models
+import scripts.utils as utils
+from scripts.ml_model import create_predictor as create_ml_predicator
+from scripts.rule_based import create_predictor as create_rule_predicator
+
+LOGGER = logging.getLogger(__name__)
+"""Capture store logger."""
+
+block_size = 4096  # packets per block of the sparse time index
+chunk_size = 65536  # packets per streamed chunk
+meta_file = "meta.json"  # store layout (columns, dtypes, packet count)
+index_file = "index.npy"  # time of the first packet of each block
+string_dtype = "str"  # marker for variable-length (text) columns
+
+
+def run(
+    build: bool = False, start: float | None = None, end: float | None = None
+):
+    """Build the capture store or score a time window of the existing one."""
+    if build:
+        LOGGER.info("Building capture store...")
+        LOGGER.debug("Loading dataset...")
+        dataset = pd.read_csv(data.DEMO_DATA)
+        build_store(data.CAPTURE_STORE, dataset)
+        LOGGER.debug(f"Capture store written to: {data.CAPTURE_STORE}")
+
+    if start is None and end is None:
+        LOGGER.debug("Capture store complete")
+        return
+
+    # score the requested window with every model
+    start = -np.inf if start is None else start
+    end = np.inf if end is None else end
+    LOGGER.info(f"Scoring window [{start}, {end})...")
+    _read_meta(data.CAPTURE_STORE)  # fail before loading the models
+    predictors = {
+        "Gradient Boosting Machine": create_ml_predicator(models.GBM_MODEL),
+        "Random Forest": create_ml_predicator(models.RAND_FOREST_MODEL),
+        "Rule-Based Prediction": create_rule_predicator(),
+    }
+    for name, predict in predictors.items():
+        predictions = score_window(data.CAPTURE_STORE, start, end, predict)
+        attacks = int(predictions.sum())
+        LOGGER.warning(
+            f"{name}: {attacks} of {len(predictions)} packets flagged"
+        )
+    LOGGER.debug("Capture store complete")
+
+
+def build_store(path: str, dataset: pd.DataFrame) -> None:
+    """Write a dataset to a new capture store, replacing any existing one.
+    Packets are sorted by their `Time` column."""
+    if "Time" not in dataset.columns:
+        raise ValueError("Dataset has no 'Time' column")
+
+    columns = [
+        {"name": str(name), "dtype": _column_dtype(dataset[name])}
+        for name in dataset.columns
+    ]
+    temp = _temp_store(path)
+    try:
+        _create_store(temp, columns)
+        _write_packets(temp, _sort_by_time(dataset))
+        _replace_store(temp, path)
+    except BaseException:
+        shutil.rmtree(temp, ignore_errors=True)
+        raise
+
+
+def append_packets(path: str, packets: pd.DataFrame) -> None:
+    """Append newly captured packets to a capture store. Packets older than
+    the last stored packet are merged in time order from the first block
+    they affect onward."""
+    meta = _read_meta(path)
+    names = [column["name"] for column in meta["columns"]]
+    if list(packets.columns) != names:
+        raise ValueError(f"Packet columns do not match store: {names}")
+    if len(packets) == 0:
+        return
+
+    # copy what is needed out of the time column, then unmap it: no map may
+    # be open while files are written or renamed (this fails on Windows)
+    packets = _sort_by_time(packets)
+    times = _open_column(path, meta, names.index("Time"))
+    earliest = float(packets["Time"].iloc[0])
+    in_order = len(times) == 0 or earliest >= float(times[-1])
+    if not in_order:
+        size = meta["block_size"]
+        index = _open_index(path, meta)
+        row = _search(times, index, size, earliest, "right")
+        first = row - row % size
+    del times
+
+    if in_order:
+        _write_packets(path, packets)
+        return
+
+    # rewrite the store from the first affected block in a temporary copy
+    LOGGER.debug(f"Out-of-order packets, merging from row {first}...")
+    stored = _read_rows(path, meta, first, meta["rows"])
+    merged = _sort_by_time(pd.concat([stored, packets], ignore_index=True))
+
+    temp = _temp_store(path)
+    try:
+        _create_store(temp, meta["columns"], path, first)
+        _write_packets(temp, merged)
+        _replace_store(temp, path)
+    except BaseException:
+        shutil.rmtree(temp, ignore_errors=True)
+        raise
+
+
+def load_window(path: str, start: float, end: float) -> pd.DataFrame:
+    """Load the packets captured within the time window `[start, end)`."""
+    meta = _read_meta(path)
+    first, last = _locate_window(path, meta, start, end)
+    return _read_rows(path, meta, first, last)
+
+
+def stream_window(
+    path: str, start: float, end: float, size: int = chunk_size
+) -> Iterator[pd.DataFrame]:
+    """Stream the packets of the time window `[start, end)` in chunks."""
+    meta = _read_meta(path)
+    first, last = _locate_window(path, meta, start, end)
+    for i in range(first, last, size):
+        yield _read_rows(path, meta, i, min(i + size, last))
+
+
+def score_window(
+    path: str,
+    start: float,
+    end: float,
+    predict: Callable[[pd.DataFrame], int],
+) -> np.ndarray:
+    """Score each packet of the time window `[start, end)` with a predictor.
+    The packet preceding the window is used to prime the predictor's state."""
+    meta = _read_meta(path)
+    first, last = _locate_window(path, meta, start, end)
+
+    if first > 0:  # prime time deltas with the preceding packet
+        predict(_read_rows(path, meta, first - 1, first))
+    predictions = np.zeros(last - first, dtype=np.int64)
+    for i in range(first, last, chunk_size):
+        chunk = _read_rows(path, meta, i, min(i + chunk_size, last))
+        for j in range(len(chunk)):
+            predictions[i - first + j] = predict(chunk.iloc[[j]])
+    return predictions
+
+
+def _locate_window(
+    path: str, meta: dict, start: float, end: float
+) -> tuple[int, int]:
+    """Find the row range of the time window `[start, end)`."""
+    names = [column["name"] for column in meta["columns"]]
+    times = _open_column(path, meta, names.index("Time"))
+    index = _open_index(path, meta)
+    first = _search(times, index, meta["block_size"], start)
+    last = _search(times, index, meta["block_size"], end)
+    return first, max(first, last)
+
+
+def _search(
+    times: np.ndarray,
+    index: np.ndarray,
+    size: int,
+    value: float,
+    side: str = "left",
+) -> int:
+    """Find the first row with a time of at least `value` (or greater than
+    `value` for the right side). The sparse block index narrows the search to
+    a single block of the memory-mapped times."""
+    block = max(int(np.searchsorted(index, value, side=side)) - 1, 0)
+    offset = block * size
+    rows = times[offset : offset + size]
+    return offset + int(np.searchsorted(rows, value, side=side))
+
+
+def _create_store(
+    path: str, columns: list[dict], source: str | None = None, rows: int = 0
+) -> None:
+    """Create the files of a store holding the first `rows` packets of the
+    source store, or an empty store without a source."""
+    meta = {"rows": rows, "block_size": block_size, "columns": columns}
+    if source is not None:
+        prefix = {**_read_meta(source), "rows": rows}
+        meta["block_size"] = prefix["block_size"]
+        for i in range(len(columns)):
+            for file, size in _committed_sizes(source, prefix, i):
+                target = os.path.join(path, os.path.basename(file))
+                _copy_prefix(file, target, size)
+        _commit(path, meta)
+        return
+
+    for i in range(len(columns)):
+        open(_column_file(path, i), "wb").close()
+        if columns[i]["dtype"] == string_dtype:
+            np.zeros(1, dtype=np.int64).tofile(_offsets_file(path, i))
+            open(_mask_file(path, i), "wb").close()
+    _commit(path, meta)
+
+
+def _write_packets(path: str, packets: pd.DataFrame) -> None:
+    """Append time-sorted packets to the column files and update the index.
+    All columns are converted before anything is written."""
+    meta = _read_meta(path)
+    converted = [
+        (
+            _to_numeric(packets[column["name"]], column)
+            if column["dtype"] != string_dtype
+            else _to_text(packets[column["name"]], column)
+        )
+        for column in meta["columns"]
+    ]
+
+    # drop data left over by an interrupted write
+    for i in range(len(converted)):
+        for file, size in _committed_sizes(path, meta, i):
+            os.truncate(file, size)
+
+    for i, values in enumerate(converted):
+        if meta["columns"][i]["dtype"] != string_dtype:
+            with open(_column_file(path, i), "ab") as file:
+                file.write(values.tobytes())
+            continue
+
+        # variable-length text: utf-8 blob, end offsets, and missing mask
+        encoded, missing = values
+        base = os.path.getsize(_column_file(path, i))
+        lengths = np.fromiter(map(len, encoded), np.int64, len(encoded))
+        with open(_column_file(path, i), "ab") as file:
+            file.write(b"".join(encoded))
+        with open(_offsets_file(path, i), "ab") as file:
+            file.write((base + np.cumsum(lengths)).tobytes())
+        with open(_mask_file(path, i), "ab") as file:
+            file.write(missing.astype(np.uint8).tobytes())
+
+    meta["rows"] += len(packets)
+    _commit(path, meta)
+
+
+def _commit(path: str, meta: dict) -> None:
+    """Write the sparse index, then the metadata. Readers only trust the
+    packet count of the metadata, so it is replaced last."""
+    names = [column["name"] for column in meta["columns"]]
+    times = _open_column(path, meta, names.index("Time"))
+    index = np.array(times[:: meta["block_size"]])
+    del times  # unmap before replacing files
+    with open(os.path.join(path, f"{index_file}.tmp"), "wb") as file:
+        np.save(file, index)
+    os.replace(
+        os.path.join(path, f"{index_file}.tmp"),
+        os.path.join(path, index_file),
+    )
+    _write_meta(path, meta)
+
+
+def _to_numeric(values: pd.Series, column: dict) -> np.ndarray:
+    """Convert packet values to the stored type of a numeric column. Missing
+    values outside float columns and lossy conversions are rejected."""
+    dtype = np.dtype(column["dtype"])
+    if values.dtype.kind not in "biuf":
+        raise ValueError(f"Column '{column['name']}' must be numeric")
+    if dtype.kind != "f" and values.isna().any():
+        raise ValueError(f"Column '{column['name']}' has missing values")
+
+    raw = values.to_numpy()
+    converted = raw.astype(dtype)
+    if not np.array_equal(converted, raw, equal_nan=dtype.kind == "f"):
+        raise ValueError(
+            f"Column '{column['name']}' values do not fit type {dtype}"
+        )
+    return converted
+
+
+def _to_text(
+    values: pd.Series, column: dict
+) -> tuple[list[bytes], np.ndarray]:
+    """Encode packet values of a text column and get their missing mask."""
+    missing = values.isna().to_numpy()
+    if not all(isinstance(value, str) for value in values[~missing]):
+        raise ValueError(f"Column '{column['name']}' must be text")
+    encoded = [
+        b"" if is_missing else value.encode()
+        for value, is_missing in zip(values, missing)
+    ]
+    return encoded, missing
+
+
+def _read_rows(path: str, meta: dict, first: int, last: int) -> pd.DataFrame:
+    """Read the rows `[first, last)` of the store into a dataset."""
+    columns = {}
+    for i, column in enumerate(meta["columns"]):
+        if column["dtype"] != string_dtype:
+            values = _open_column(path, meta, i)[first:last]
+            columns[column["name"]] = np.array(values)
+            continue
+
+        offsets = _open_offsets(path, meta, i)[first : last + 1]
+        missing = _open_mask(path, meta, i)[first:last]
+        blob = bytes(_open_column(path, meta, i)[offsets[0] : offsets[-1]])
+        bounds = offsets - offsets[0]
+        columns[column["name"]] = [
+            np.nan if missing[j] else blob[bounds[j] : bounds[j + 1]].decode()
+            for j in range(last - first)
+        ]
+    return pd.DataFrame(columns, index=pd.RangeIndex(last - first))
+
+
+def _open_column(path: str, meta: dict, i: int) -> np.ndarray:
+    """Memory-map a column file (raw bytes for text columns)."""
+    column = meta["columns"][i]
+    if column["dtype"] == string_dtype:
+        dtype = np.dtype(np.uint8)
+        size = int(_open_offsets(path, meta, i)[-1])
+    else:
+        dtype = np.dtype(column["dtype"])
+        size = meta["rows"] * dtype.itemsize
+    if size == 0:  # empty files cannot be memory-mapped
+        return np.zeros(0, dtype=dtype)
+    shape = size // dtype.itemsize
+    return np.memmap(_column_file(path, i), dtype, "r", shape=shape)
+
+
+def _open_offsets(path: str, meta: dict, i: int) -> np.ndarray:
+    """Memory-map the value offsets of a text column."""
+    shape = meta["rows"] + 1
+    return np.memmap(_offsets_file(path, i), np.int64, "r", shape=shape)
+
+
+def _open_index(path: str, meta: dict) -> np.ndarray:
+    """Load the sparse index of the committed blocks."""
+    blocks = -(-meta["rows"] // meta["block_size"])
+    return np.load(os.path.join(path, index_file))[:blocks]
+
+
+def _open_mask(path: str, meta: dict, i: int) -> np.ndarray:
+    """Memory-map the missing values mask of a text column."""
+    if meta["rows"] == 0:  # empty files cannot be memory-mapped
+        return np.zeros(0, dtype=np.bool_)
+    shape = meta["rows"]
+    return np.memmap(_mask_file(path, i), np.bool_, "r", shape=shape)
+
+
+def _committed_sizes(path: str, meta: dict, i: int) -> list[tuple[str, int]]:
+    """Get the size of each file of a column holding the committed rows."""
+    column = meta["columns"][i]
+    rows = meta["rows"]
+    if column["dtype"] != string_dtype:
+        itemsize = np.dtype(column["dtype"]).itemsize
+        return [(_column_file(path, i), rows * itemsize)]
+    return [
+        (_column_file(path, i), int(_open_offsets(path, meta, i)[-1])),
+        (_offsets_file(path, i), (rows + 1) * np.dtype(np.int64).itemsize),
+        (_mask_file(path, i), rows),
+    ]
+
+
+def _copy_prefix(source: str, target: str, size: int) -> None:
+    """Copy the first `size` bytes of a file."""
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        while size > 0:
+            chunk = src.read(min(size, 2**20))
+            if not chunk:
+                raise ValueError(f"Capture store file is truncated: {source}")
+            dst.write(chunk)
+            size -= len(chunk)
+
+
+def _temp_store(path: str) -> str:
+    """Create a temporary directory next to a store."""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    prefix = f".{os.path.basename(path)}."
+    return tempfile.mkdtemp(prefix=prefix, dir=parent)
+
+
+def _replace_store(source: str, path: str) -> None:
+    """Move a complete store into place. The existing store is only removed
+    once the new one has replaced it."""
+    backup = f"{source}.old"
+    if os.path.exists(path):
+        os.replace(path, backup)
+    os.replace(source, path)
+    shutil.rmtree(backup, ignore_errors=True)
+
+
+def _sort_by_time(dataset: pd.DataFrame) -> pd.DataFrame:
+    """Sort a dataset by capture time, preserving the order of ties."""
+    dataset = dataset.sort_values("Time", kind="mergesort")
+    return dataset.reset_index(drop=True)
+
+
+def _column_dtype(values: pd.Series) -> str:
+    """Get the stored data type of a dataset column."""
+    if values.dtype.kind in "biuf":
+        return str(values.dtype)
+    return string_dtype
+
+
+def _column_file(path: str, i: int) -> str:
+    return os.path.join(path, f"column_{i}.bin")
+
+
+def _offsets_file(path: str, i: int) -> str:
+    return os.path.join(path, f"column_{i}.offsets")
+
+
+def _mask_file(path: str, i: int) -> str:
+    return os.path.join(path, f"column_{i}.mask")
+
+
+def _read_meta(path: str) -> dict:
+    if not os.path.exists(os.path.join(path, meta_file)):
+        raise FileNotFoundError(
+            f"Capture store not found: {path} (build it with --build)"
+        )
+    with open(os.path.join(path, meta_file)) as file:
+        return json.load(file)
+
+
+def _write_meta(path: str, meta: dict) -> None:
+    with open(os.path.join(path, f"{meta_file}.tmp"), "w") as file:
+        json.dump(meta, file, indent=2)
+    os.replace(
+        os.path.join(path, f"{meta_file}.tmp"),
+        os.path.join(path, meta_file),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Capture store script.")
+    parser.add_argument(
+        "-b", "--build", action="store_true", help="build capture store"
+    )
+    parser.add_argument(
+        "-s", "--start", type=float, help="start time of window to score"
+    )
+    parser.add_argument(
+        "-e", "--end", type=float, help="end time of window to score"
+    )
+    args = parser.parse_args()
+    if not args.build and args.start is None and args.end is None:
+        parser.error("nothing to do, pass --build and/or --start/--end")
+
+    utils.setup_logging(debug=True)
+    try:
+        run(args.build, args.start, args.end)
+    except KeyboardInterrupt:
+        LOGGER.warning("Execution interrupted")
+        exit(0)
+    except Exception as exception:
+        LOGGER.exception(exception)
+        LOGGER.error(f"Execution failed")
+        exit(1)
@@ -0,0 +1,191 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd  # type: ignore
+import sklearn.metrics as metrics  # type: ignore
+from scipy.sparse import load_npz  # type: ignore
+
+import data
+import scripts.utils as utils
+from scripts.ml_model import classifier, create_model, model_name
+
+LOGGER = logging.getLogger(__name__)
+"""Cross-validation logger."""
+
+folds = 5  # number of time-ordered blocks per capture
+
+Ranges = list[tuple[int, int]]  # row ranges `[start, stop)` of a fold split
+Fold = tuple[str, int, Ranges, Ranges]  # scheme, number, train and test rows
+
+# shared arrays attached by each fold worker
+_shared_memory: list[SharedMemory] = []
+_features: np.ndarray
+_labels: np.ndarray
+
+
+def run():
+    """Run the cross-validation script."""
+    LOGGER.info("Cross-validating model (%s)...", model_name)
+
+    LOGGER.debug("Loading features and labels...")
+    # trees train on float32, so share features in the type they use
+    features = load_npz(data.FEATURES_TRAIN).astype(np.float32).toarray()
+    labels = np.load(data.LABELS_TRAIN)
+    evaluations = create_folds(labels, folds)
+    LOGGER.debug(f"Created {len(evaluations)} folds of {len(labels)} rows")
+
+    # share arrays with fold workers
+    LOGGER.debug("Sharing features and labels with workers...")
+    features_memory = _share(features)
+    labels_memory = _share(labels)
+    shared = [
+        (features_memory.name, features.shape, features.dtype.str),
+        (labels_memory.name, labels.shape, labels.dtype.str),
+    ]
+    del features  # workers read the shared copy
+
+    # one worker per fold, up to the cpu count; each worker gathers its own
+    # training blocks (up to ~80% of the features) and holds a trained model
+    workers = min(len(evaluations), os.cpu_count() or 1)
+    try:
+        LOGGER.debug(f"Evaluating folds ({workers} workers)...")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(
+            workers, initializer=_attach, initargs=(shared,)
+        ) as executor:
+            results = list(executor.map(evaluate_fold, evaluations))
+        duration = time.perf_counter() - start
+    finally:
+        for memory in (features_memory, labels_memory):
+            memory.close()
+            memory.unlink()
+
+    # report per-fold results and summary for each scheme
+    results = pd.DataFrame(results)
+    for scheme, scheme_results in results.groupby("scheme", sort=False):
+        scheme_results = scheme_results.drop(columns="scheme")
+        summary = scheme_results.drop(columns="fold").agg(["mean", "std"])
+        LOGGER.warning(
+            f"{scheme} results:\n{scheme_results.to_string(index=False)}"
+        )
+        LOGGER.warning(f"{scheme} summary:\n{summary.to_string()}")
+    LOGGER.warning(f"Total evaluation time: {duration:.2f}s")
+    LOGGER.debug("Cross-validation complete")
+
+
+def create_folds(labels: np.ndarray, count: int) -> list[Fold]:
+    """Create blocked k-fold and walk-forward folds of the dataset. Each
+    capture (a run of equal labels) is split into `count` contiguous blocks,
+    and fold `k` is made of block `k` of every capture, so that folds keep
+    time order and contain both classes. Captures must have at least `count`
+    rows so that no block is empty."""
+    bounds = [0, *(np.flatnonzero(np.diff(labels)) + 1), len(labels)]
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if stop - start < count:
+            raise ValueError(
+                f"Capture at rows [{start}, {stop}) is too short "
+                f"to split into {count} folds"
+            )
+    blocks = [
+        np.linspace(start, stop, count + 1).astype(int)
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+
+    def rows(selected: range) -> Ranges:
+        """Get the row ranges of the selected blocks across captures."""
+        ranges = []
+        for edges in blocks:
+            for k in selected:
+                ranges.append((int(edges[k]), int(edges[k + 1])))
+        return ranges
+
+    evaluations: list[Fold] = []
+    for k in range(count):  # train on all other blocks
+        train = rows(range(0, k)) + rows(range(k + 1, count))
+        test = rows(range(k, k + 1))
+        evaluations.append(("Blocked k-fold", k + 1, train, test))
+    for k in range(1, count):  # train on all previous blocks
+        train, test = rows(range(0, k)), rows(range(k, k + 1))
+        evaluations.append(("Walk-forward", k, train, test))
+    return evaluations
+
+
+def evaluate_fold(fold: Fold) -> dict:
+    """Train and evaluate a model on a fold of the shared dataset."""
+    scheme, number, train, test = fold
+    # training blocks are not contiguous, so gather them once for fitting
+    train_features = np.concatenate([_features[i:j] for i, j in train])
+    train_labels = np.concatenate([_labels[i:j] for i, j in train])
+    test_labels = np.concatenate([_labels[i:j] for i, j in test])
+
+    # train model, one job per worker
+    model = create_model(classifier, jobs=1)
+    start = time.perf_counter()
+    model.fit(train_features, train_labels)
+    training_time = time.perf_counter() - start
+
+    # evaluate model on views of the shared features
+    start = time.perf_counter()
+    predictions = np.concatenate(
+        [model.predict(_features[i:j]) for i, j in test]
+    )
+    inference_time = time.perf_counter() - start
+
+    return {
+        "scheme": scheme,
+        "fold": number,
+        "train size": len(train_labels),
+        "test size": len(test_labels),
+        "accuracy": metrics.accuracy_score(test_labels, predictions),
+        "precision": metrics.precision_score(
+            test_labels, predictions, zero_division=0
+        ),
+        "recall": metrics.recall_score(
+            test_labels, predictions, zero_division=0
+        ),
+        "f1": metrics.f1_score(test_labels, predictions, zero_division=0),
+        "training (s)": training_time,
+        "inference (s)": inference_time,
+        "inference (us/packet)": inference_time / len(test_labels) * 1e6,
+    }
+
+
+def _share(array: np.ndarray) -> SharedMemory:
+    """Copy an array into a new shared memory block."""
+    memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, array.dtype, buffer=memory.buf)
+    shared[:] = array
+    return memory
+
+
+def _attach(shared: list[tuple[str, tuple[int, ...], str]]):
+    """Attach a fold worker to the shared features and labels."""
+    global _features, _labels
+    arrays = []
+    for name, shape, dtype in shared:
+        memory = SharedMemory(name=name)
+        _shared_memory.append(memory)  # keep buffer alive in the worker
+        arrays.append(np.ndarray(shape, dtype, buffer=memory.buf))
+    _features, _labels = arrays
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cross-validation script.")
+    args = parser.parse_args()
+
+    utils.setup_logging(debug=True)
+    try:
+        run()
+    except KeyboardInterrupt:
+        LOGGER.warning("Execution interrupted")
+        exit(0)
+    except Exception as exception:
+        LOGGER.exception(exception)
+        LOGGER.error(f"Execution failed")
+        exit(1)
@@ -37,10 +37,8 @@ def run():
 
     # train model
     LOGGER.debug("Training model...")
-    if classifier == models.GBM_MODEL:
-        model = GradientBoostingClassifier(verbose=1)
-    else:
-        model = RandomForestClassifier(n_jobs=-1, verbose=1)
+    model = create_model(classifier)
+    model.verbose = 1  # type: ignore
     model.fit(training_features, training_labels)
     model.verbose = 0  # type: ignore
 
@@ -64,6 +62,15 @@ def run():
     LOGGER.debug("Model training complete")
 
 
+def create_model(
+    classifier, jobs: int = -1
+) -> GradientBoostingClassifier | RandomForestClassifier:
+    """Create an untrained model of the given classifier."""
+    if classifier == models.GBM_MODEL:
+        return GradientBoostingClassifier()
+    return RandomForestClassifier(n_jobs=jobs)
+
+
 def create_predictor(classifier):
     """Create a model predictor."""
 